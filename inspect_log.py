@@ -1,32 +1,78 @@
 import re
-import json
+
+import orjson
 
 LOG_FILE = r"C:\projects\openclawproxy\proxy_capture.log"
 
-with open(LOG_FILE, encoding="utf-8", errors="replace") as f:
-    content = f.read()
+# Each request block starts at the logger's catch-all separator line
+_BLOCK_MARKER = b"CATCH-ALL: POST /v1/responses"
+
+# Every log record starts with the logging timestamp; the JSON body lines
+# following a BODY: record don't, so the next timestamped line ends the body.
+# Bytes patterns: the log is scanned undecoded (\r? for logs written on Windows).
+_RECORD_RE = re.compile(rb'\d{4}-\d{2}-\d{2} \d\d:\d\d:\d\d,')
+_BODY_RE = re.compile(rb'\d{4}-\d{2}-\d{2} \d\d:\d\d:\d\d,\d+ BODY:\r?$')
+
+# Per-block fields, compiled once rather than on every block. Every header
+# starts with a log record, so _TS_RE is anchored with match() at offset 0.
+# _CL_RE is searched across the whole header and starts with a literal ("'"):
+# _sre then skips ahead to candidate positions with a memchr-style prefix
+# scan instead of trying the pattern at every offset. Keep the patterns
+# separate — an alternation has no single leading literal and loses that
+# fast path.
+_TS_RE = re.compile(rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+_CL_RE = re.compile(rb"'content-length': '(\d+)'")
+
+
+def iter_request_blocks(log_path):
+    """Yield (header, body) bytes for each POST /v1/responses block.
+
+    Single pass over the log, one line at a time — the file is never read
+    into memory whole, and nothing is decoded. body is None if the block had
+    no BODY: record.
+    """
+    header = body = None
+    with open(log_path, "rb") as f:
+        for line in f:
+            if body is not None:
+                if not _RECORD_RE.match(line):
+                    body.append(line)
+                    continue
+                yield b"".join(header), b"".join(body)
+                header = body = None
 
-# Split on the separator lines for each request
-requests = re.split(r'CATCH-ALL: POST /v1/responses', content)
+            if _BLOCK_MARKER in line:
+                if header is not None:
+                    yield b"".join(header), None
+                header = []
+            elif header is not None:
+                if _BODY_RE.match(line):
+                    body = []
+                else:
+                    header.append(line)
 
-print(f"Total request blocks found: {len(requests) - 1}\n")
+    if header is not None:
+        yield b"".join(header), b"".join(body) if body is not None else None
+
+
+n_blocks = 0
+for i, (header, body_text) in enumerate(iter_request_blocks(LOG_FILE), 1):
+    n_blocks = i
+
+    # Get timestamp from the first log record in the block
+    ts_match = _TS_RE.match(header)
+    ts = ts_match.group(1).decode() if ts_match else "?"
 
-for i, block in enumerate(requests[1:], 1):
-    # Get timestamp from HEADERS line
-    ts_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', block)
-    ts = ts_match.group(1) if ts_match else "?"
-    
     # Get content-length
-    cl_match = re.search(r"'content-length': '(\d+)'", block)
-    cl = cl_match.group(1) if cl_match else "?"
-    
-    # Try to find the start of the JSON body and count input items
-    body_match = re.search(r'BODY:\n(\{.*?)(?=\n\d{4}-\d{2}-\d{2}|$)', block, re.DOTALL)
+    cl_match = _CL_RE.search(header)
+    cl = cl_match.group(1).decode() if cl_match else "?"
+
+    # Parse the JSON body and count input items
     n_items = "?"
     has_tool_calls = False
-    if body_match:
+    if body_text is not None:
         try:
-            body = json.loads(body_match.group(1))
+            body = orjson.loads(body_text)
             items = body.get("input", [])
             n_items = len(items)
             has_tool_calls = any(
@@ -35,5 +81,7 @@ for i, block in enumerate(requests[1:], 1):
             )
         except Exception:
             pass
-    
+
     print(f"Request {i:02d} | {ts} | content-length={cl:>7} | input_items={n_items} | tool_calls={has_tool_calls}")
+
+print(f"\nTotal request blocks found: {n_blocks}")
@@ -5,30 +5,78 @@ Logs all traffic for analysis without modifying anything.
 """
 
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import Response, StreamingResponse
 import httpx
-import json
+import orjson
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 # --- Config ---
 LISTEN_PORT = 1234
 BACKEND_URL = "http://localhost:12345"
 LOG_FILE = "proxy_capture.log"
+# Streamed responses are written here, one .sse file per request
+STREAM_LOG_DIR = "logs"
 
 # --- Logging setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(LOG_FILE)
-    ]
-)
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that enqueues records without formatting them.
+
+    The stock prepare() renders the message in the logging thread; skipping it
+    leaves all formatting (e.g. LazyJSON bodies) to the listener thread.
+    """
+    def prepare(self, record):
+        return record
+
+class LazyJSON:
+    """Pretty-prints obj only when a handler actually renders the record."""
+    __slots__ = ("obj", "_text")
+
+    def __init__(self, obj):
+        self.obj = obj
+        self._text = None
+
+    def __str__(self):
+        # Cached: every handler on the listener formats the same record
+        if self._text is None:
+            self._text = orjson.dumps(self.obj, option=orjson.OPT_INDENT_2).decode()
+        return self._text
+
+# Request handlers only enqueue records; a background listener thread does the
+# formatting and console/file writes so multi-KB body dumps never block the
+# event loop.
+log_formatter = logging.Formatter("%(asctime)s %(message)s")
+console_handler = logging.StreamHandler()
+file_handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
+console_handler.setFormatter(log_formatter)
+file_handler.setFormatter(log_formatter)
+
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler)
+logging.basicConfig(level=logging.INFO, handlers=[DeferredQueueHandler(log_queue)])
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="LLM Logging Proxy")
+# Shared pooled client so backend connections are kept alive across requests
+client = httpx.AsyncClient(
+    base_url=BACKEND_URL,
+    timeout=300,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await client.aclose()
+
+app = FastAPI(title="LLM Logging Proxy", lifespan=lifespan)
 
 def log_separator(label: str):
     logger.info(f"\n{'='*60}")
@@ -57,7 +105,9 @@ def summarize_messages(messages: list) -> dict:
 
 @app.post("/v1/chat/completions")
 async def proxy_chat(request: Request):
-    body = await request.json()
+    # Parsed for logging only; the backend gets the original bytes
+    raw = await request.body()
+    body = orjson.loads(raw)
     stream = body.get("stream", False)
 
     log_separator("INCOMING REQUEST")
@@ -65,73 +115,79 @@ async def proxy_chat(request: Request):
     # Structural summary first for quick reads
     messages = body.get("messages", [])
     summary = summarize_messages(messages)
-    logger.info(f"STRUCTURE SUMMARY:\n{json.dumps(summary, indent=2)}")
+    if body.get("tools"):
+        summary["tool_definitions_count"] = len(body["tools"])
+    # Rendered later by the log listener, so summary must not change after this
+    logger.info("STRUCTURE SUMMARY:\n%s", LazyJSON(summary))
     
     # Tool definitions if present
     if body.get("tools"):
-        summary["tool_definitions_count"] = len(body["tools"])
         tool_names = [t.get("function", {}).get("name", "unknown") for t in body["tools"]]
         logger.info(f"TOOLS DEFINED: {tool_names}")
 
     # Full request body
-    logger.info(f"FULL REQUEST BODY:\n{json.dumps(body, indent=2)}")
+    logger.info("FULL REQUEST BODY:\n%s", LazyJSON(body))
 
     start_time = time.time()
 
     if stream:
         # Handle streaming
         async def stream_generator():
-            chunks = []
-            async with httpx.AsyncClient(timeout=300) as client:
+            """Relay the SSE byte stream verbatim, copying it to a .sse file.
+
+            aiter_bytes() keeps llama-server's exact SSE framing; re-joining
+            aiter_lines() output with \\n\\n split 'event:' and 'data:' fields
+            into separate events (see proxy._stream_forward).
+            """
+            bytes_written = 0
+            # Write the stream to disk as it flows rather than holding it all
+            # in memory until the response completes
+            os.makedirs(STREAM_LOG_DIR, exist_ok=True)
+            stream_path = os.path.join(STREAM_LOG_DIR, f"stream_{datetime.now():%Y%m%d-%H%M%S-%f}.sse")
+            with open(stream_path, "wb", buffering=1 << 16) as stream_log:
                 async with client.stream(
                     "POST",
-                    f"{BACKEND_URL}/v1/chat/completions",
-                    json=body,
+                    "/v1/chat/completions",
+                    content=raw,
                     headers={"Content-Type": "application/json"}
                 ) as resp:
-                    async for line in resp.aiter_lines():
-                        if line:
-                            yield f"{line}\n\n"
-                            chunks.append(line)
+                    async for chunk in resp.aiter_bytes():
+                        yield chunk
+                        bytes_written += stream_log.write(chunk)
 
             elapsed = time.time() - start_time
             log_separator(f"STREAMING RESPONSE (completed in {elapsed:.2f}s)")
-            logger.info(f"TOTAL CHUNKS: {len(chunks)}")
-            # Log full stream for analysis
-            for chunk in chunks:
-                logger.info(chunk)
+            logger.info(f"STREAM LOG: {stream_path} ({bytes_written} bytes)")
 
         return StreamingResponse(stream_generator(), media_type="text/event-stream")
 
     else:
         # Handle non-streaming
-        async with httpx.AsyncClient(timeout=300) as client:
-            resp = await client.post(
-                f"{BACKEND_URL}/v1/chat/completions",
-                json=body,
-                headers={"Content-Type": "application/json"}
-            )
+        resp = await client.post(
+            "/v1/chat/completions",
+            content=raw,
+            headers={"Content-Type": "application/json"}
+        )
 
         elapsed = time.time() - start_time
-        resp_json = resp.json()
+        resp_json = orjson.loads(resp.content)
 
         log_separator(f"RESPONSE (completed in {elapsed:.2f}s)")
         
         # Log usage stats if present
         if "usage" in resp_json:
-            logger.info(f"TOKEN USAGE: {json.dumps(resp_json['usage'], indent=2)}")
+            logger.info("TOKEN USAGE: %s", LazyJSON(resp_json["usage"]))
         
-        logger.info(f"FULL RESPONSE:\n{json.dumps(resp_json, indent=2)}")
+        logger.info("FULL RESPONSE:\n%s", LazyJSON(resp_json))
 
-        return JSONResponse(content=resp_json)
+        return Response(content=resp.content, media_type="application/json")
 
 
 @app.get("/v1/models")
 async def proxy_models(request: Request):
     """Forward model list requests transparently."""
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(f"{BACKEND_URL}/v1/models")
-    return JSONResponse(content=resp.json())
+    resp = await client.get("/v1/models", timeout=30)
+    return Response(content=resp.content, media_type="application/json")
 
 
 @app.get("/health")
@@ -142,36 +198,33 @@ async def health():
 @app.api_route("/{full_path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
 async def catch_all(full_path: str, request: Request):
     """Catch any path we haven't explicitly handled - log and forward."""
-    body = None
+    raw = await request.body()
     try:
-        body = await request.json()
-    except Exception:
-        body = await request.body()
-        body = body.decode("utf-8", errors="replace") if body else None
+        body = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        body = raw.decode("utf-8", errors="replace") if raw else None
 
     log_separator(f"CATCH-ALL: {request.method} /{full_path}")
     logger.info(f"METHOD: {request.method}")
     logger.info(f"PATH: /{full_path}")
     logger.info(f"HEADERS: {dict(request.headers)}")
     if body:
-        logger.info(f"BODY:\n{json.dumps(body, indent=2) if isinstance(body, dict) else body}")
+        logger.info("BODY:\n%s", LazyJSON(body) if isinstance(body, dict) else body)
 
     # Forward to backend
-    async with httpx.AsyncClient(timeout=300) as client:
-        resp = await client.request(
-            method=request.method,
-            url=f"{BACKEND_URL}/{full_path}",
-            json=body if isinstance(body, dict) else None,
-            content=body.encode() if isinstance(body, str) else None,
-            headers={"Content-Type": request.headers.get("content-type", "application/json")}
-        )
+    resp = await client.request(
+        method=request.method,
+        url=f"/{full_path}",
+        content=raw or None,
+        headers={"Content-Type": request.headers.get("content-type", "application/json")}
+    )
 
     log_separator(f"CATCH-ALL RESPONSE: {resp.status_code}")
     try:
-        resp_json = resp.json()
-        logger.info(json.dumps(resp_json, indent=2))
-        return JSONResponse(content=resp_json, status_code=resp.status_code)
-    except Exception:
+        resp_json = orjson.loads(resp.content)
+        logger.info("%s", LazyJSON(resp_json))
+        return Response(content=resp.content, status_code=resp.status_code, media_type="application/json")
+    except orjson.JSONDecodeError:
         logger.info(f"RAW RESPONSE: {resp.text}")
         from fastapi.responses import PlainTextResponse
         return PlainTextResponse(content=resp.text, status_code=resp.status_code)
@@ -181,4 +234,5 @@ if __name__ == "__main__":
     import uvicorn
     logger.info(f"Starting proxy on port {LISTEN_PORT} -> {BACKEND_URL}")
     logger.info(f"Capturing logs to: {LOG_FILE}")
-    uvicorn.run(app, host="0.0.0.0", port=LISTEN_PORT)
\ No newline at end of file
+    # loop/http "auto" pick uvloop + httptools when installed (uvicorn[standard])
+    uvicorn.run(app, host="0.0.0.0", port=LISTEN_PORT, loop="auto", http="auto", access_log=False)
\ No newline at end of file
@@ -29,13 +29,14 @@ Both can be toggled below. Logging shows per-request normalization stats.
 """
 
 import re
-import json
 import time
-import copy
 import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import Response, StreamingResponse
 import httpx
+import orjson
 
 # ── Config ────────────────────────────────────────────────────────────────────
 LISTEN_PORT = 1234
@@ -49,6 +50,10 @@ STRIP_MESSAGE_IDS = True
 # Secondary fix: strip [Day YYYY-MM-DD HH:MM UTC] from user message text.
 STRIP_TIMESTAMPS = True
 
+# Normalized texts remembered across requests. Every turn resends the whole
+# history, so this should comfortably exceed the user messages in a session.
+STRIP_CACHE_SIZE = 256
+
 # ── Patterns ─────────────────────────────────────────────────────────────────
 # Matches the "message_id" line inside any JSON block (with optional trailing comma)
 _MSG_ID_RE = re.compile(
@@ -60,6 +65,11 @@ _TIMESTAMP_RE = re.compile(
     r'\[(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) \d{4}-\d{2}-\d{2} \d{2}:\d{2} UTC\] '
 )
 
+# Both of the above as one alternation, so each string is scanned only once
+_STRIP_RE = re.compile(
+    rf'(?P<ts>{_TIMESTAMP_RE.pattern})|(?P<msg_id>{_MSG_ID_RE.pattern})'
+)
+
 # ── Logging ───────────────────────────────────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
@@ -72,23 +82,75 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 # ── App ───────────────────────────────────────────────────────────────────────
-app = FastAPI(title="OpenClaw→llama Optimization Proxy")
+# One pooled client for every backend call, so keep-alive connections to
+# llama-server are reused instead of re-created per request.
+client = httpx.AsyncClient(
+    base_url=BACKEND_URL,
+    timeout=300,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await client.aclose()
 
 
+app = FastAPI(title="OpenClaw→llama Optimization Proxy", lifespan=lifespan)
+
+
+@lru_cache(maxsize=STRIP_CACHE_SIZE)
 def _strip_text(text: str) -> tuple[str, int, int]:
     """Apply all enabled normalizations to a text string.
 
     Returns (normalized_text, ts_removed, msg_ids_removed).
+
+    Memoized on the exact text: history user messages are resent unchanged
+    every turn, and the system prompt repeats verbatim across the requests
+    of a tool-call loop, so most calls become a dict lookup instead of a
+    regex pass over up to ~50KB.
     """
     ts_n = msg_id_n = 0
 
-    if STRIP_TIMESTAMPS:
-        text, ts_n = _TIMESTAMP_RE.subn("", text)
+    def _drop(m: re.Match) -> str:
+        nonlocal ts_n, msg_id_n
+        if m.lastgroup == "ts":
+            if not STRIP_TIMESTAMPS:
+                return m.group()
+            ts_n += 1
+        else:
+            if not STRIP_MESSAGE_IDS:
+                return m.group()
+            msg_id_n += 1
+        return ""
+
+    text = _STRIP_RE.sub(_drop, text)
+    return text, ts_n, msg_id_n
 
-    if STRIP_MESSAGE_IDS:
-        text, msg_id_n = _MSG_ID_RE.subn("", text)
 
-    return text, ts_n, msg_id_n
+def _has_volatile_fields(raw: bytes) -> bool:
+    """Cheap pre-check on the undecoded request body.
+
+    Plain bytes substring tests (memmem in C) for the literal part of each
+    enabled pattern. Both literals survive JSON string escaping, so a miss
+    means normalize_input could not strip anything.
+    """
+    return (STRIP_MESSAGE_IDS and b"message_id" in raw) or (
+        STRIP_TIMESTAMPS and b" UTC] " in raw
+    )
+
+
+def _may_need_strip(text: str) -> bool:
+    """str counterpart of _has_volatile_fields, checked per text.
+
+    Most history texts contain neither marker; skipping them avoids the
+    regex pass and even the _strip_text cache lookup, which hashes the
+    whole string.
+    """
+    return (STRIP_MESSAGE_IDS and "message_id" in text) or (
+        STRIP_TIMESTAMPS and " UTC] " in text
+    )
 
 
 def normalize_input(input_items: list) -> tuple[list, dict]:
@@ -98,52 +160,100 @@ def normalize_input(input_items: list) -> tuple[list, dict]:
       - role="system",    content: str          → normalize system prompt text
       - role="user",      content: [{type, text}] → normalize user message text
       - everything else                           → pass through unchanged
-    """
-    items = copy.deepcopy(input_items)
-    stats = {"ts_removed": 0, "msg_ids_removed": 0, "items_modified": 0}
 
-    for item in items:
-        modified = False
+    Only items that actually change are copied (copy-on-write); all others
+    are shared with input_items, which is never mutated.
 
-        role = item.get("role")
-        content = item.get("content")
+    Specialized for OpenClaw's shape: one system prompt (input[0]) followed
+    by history where user messages are the only other items carrying text
+    to strip, so the user branch is tested first. Texts without either
+    marker are skipped before _strip_text.
+    """
+    items = []
+    # Plain local counters in the loop; the stats dict is built once at the end
+    ts_removed = msg_ids_removed = items_modified = 0
 
-        # System prompt: content is a plain string
-        if (role == "system" or role == "developer") and isinstance(content, str):
-            new_text, ts_n, mid_n = _strip_text(content)
-            if new_text != content:
-                item["content"] = new_text
-                stats["ts_removed"] += ts_n
-                stats["msg_ids_removed"] += mid_n
-                modified = True
+    for item in input_items:
+        role = item.get("role")
 
         # User messages: content is a list of content blocks
-        elif role == "user" and isinstance(content, list):
-            for block in content:
-                if block.get("type") == "input_text" and "text" in block:
-                    original = block["text"]
+        if role == "user":
+            content = item.get("content")
+            if isinstance(content, list):
+                new_content = None
+                for i, block in enumerate(content):
+                    if block.get("type") != "input_text":
+                        continue
+                    original = block.get("text")
+                    if original is None or not _may_need_strip(original):
+                        continue
                     new_text, ts_n, mid_n = _strip_text(original)
                     if new_text != original:
-                        block["text"] = new_text
-                        stats["ts_removed"] += ts_n
-                        stats["msg_ids_removed"] += mid_n
-                        modified = True
-
-        if modified:
-            stats["items_modified"] += 1
+                        if new_content is None:
+                            new_content = list(content)
+                        new_content[i] = {**block, "text": new_text}
+                        ts_removed += ts_n
+                        msg_ids_removed += mid_n
+                if new_content is not None:
+                    item = {**item, "content": new_content}
+                    items_modified += 1
 
+        # System prompt: content is a plain string
+        elif role == "system" or role == "developer":
+            content = item.get("content")
+            if isinstance(content, str) and _may_need_strip(content):
+                new_text, ts_n, mid_n = _strip_text(content)
+                if new_text != content:
+                    item = {**item, "content": new_text}
+                    ts_removed += ts_n
+                    msg_ids_removed += mid_n
+                    items_modified += 1
+
+        items.append(item)
+
+    stats = {
+        "ts_removed": ts_removed,
+        "msg_ids_removed": msg_ids_removed,
+        "items_modified": items_modified,
+    }
     return items, stats
 
 
+def _relay(resp: httpx.Response) -> Response:
+    """Return a backend response to the client verbatim.
+
+    The proxy never inspects response bodies, so relay the bytes as-is
+    instead of decoding and re-encoding the JSON.
+    """
+    return Response(
+        content=resp.content,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type", "application/json"),
+    )
+
+
 # ── Route handlers ────────────────────────────────────────────────────────────
 
+# Requests forwarded without running normalize_input at all
+_fast_path_skips = 0
+
+
 @app.post("/v1/responses")
 async def proxy_responses(request: Request):
     """Normalize then forward a Responses API request."""
-    body = await request.json()
+    global _fast_path_skips
+
+    raw = await request.body()
+    body = orjson.loads(raw)
 
     original_input = body.get("input", [])
-    normalized_input, stats = normalize_input(original_input)
+    fast_path = not _has_volatile_fields(raw)
+    if fast_path:
+        _fast_path_skips += 1
+        normalized_input = original_input
+        stats = {"ts_removed": 0, "msg_ids_removed": 0, "items_modified": 0}
+    else:
+        normalized_input, stats = normalize_input(original_input)
 
     # Count input tokens from last completed response for logging context
     n_items = len(original_input)
@@ -161,27 +271,35 @@ async def proxy_responses(request: Request):
 
     # Warn if no normalizations applied (cache will still miss)
     if stats["ts_removed"] == 0 and stats["msg_ids_removed"] == 0:
-        log.warning("  → no volatile fields found; prompt sent as-is")
-
-    modified_body = {**body, "input": normalized_input}
+        if fast_path:
+            log.warning(
+                "  → no volatile markers in body; normalization skipped "
+                "(%d fast-path skips so far)",
+                _fast_path_skips,
+            )
+        else:
+            log.warning("  → no volatile fields found; prompt sent as-is")
+        # Nothing changed, so forward the client's bytes without re-serializing
+        payload = raw
+    else:
+        payload = orjson.dumps({**body, "input": normalized_input})
 
     if is_stream:
         return StreamingResponse(
-            _stream_forward("/v1/responses", modified_body),
+            _stream_forward("/v1/responses", payload),
             media_type="text/event-stream",
             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
 
-    async with httpx.AsyncClient(timeout=300) as client:
-        resp = await client.post(
-            f"{BACKEND_URL}/v1/responses",
-            json=modified_body,
-            headers={"Content-Type": "application/json"},
-        )
-    return JSONResponse(content=resp.json(), status_code=resp.status_code)
+    resp = await client.post(
+        "/v1/responses",
+        content=payload,
+        headers={"Content-Type": "application/json"},
+    )
+    return _relay(resp)
 
 
-async def _stream_forward(path: str, body: dict):
+async def _stream_forward(path: str, payload: bytes):
     """Pass the SSE byte stream from llama-server through verbatim.
 
     Using aiter_bytes() instead of aiter_lines() preserves the exact SSE
@@ -191,24 +309,22 @@ async def _stream_forward(path: str, body: dict):
     """
     t0 = time.time()
     bytes_sent = 0
-    async with httpx.AsyncClient(timeout=300) as client:
-        async with client.stream(
-            "POST",
-            f"{BACKEND_URL}{path}",
-            json=body,
-            headers={"Content-Type": "application/json"},
-        ) as resp:
-            async for chunk in resp.aiter_bytes():
-                yield chunk
-                bytes_sent += len(chunk)
+    async with client.stream(
+        "POST",
+        path,
+        content=payload,
+        headers={"Content-Type": "application/json"},
+    ) as resp:
+        async for chunk in resp.aiter_bytes():
+            yield chunk
+            bytes_sent += len(chunk)
     log.info("  → stream done in %.1fs, %d bytes", time.time() - t0, bytes_sent)
 
 
 @app.get("/v1/models")
 async def proxy_models():
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(f"{BACKEND_URL}/v1/models")
-    return JSONResponse(content=resp.json())
+    resp = await client.get("/v1/models", timeout=30)
+    return _relay(resp)
 
 
 @app.get("/health")
@@ -227,31 +343,21 @@ async def health():
 )
 async def catch_all(full_path: str, request: Request):
     """Transparent passthrough for any path not explicitly handled."""
-    body = None
-    try:
-        body = await request.json()
-    except Exception:
-        raw = await request.body()
-        body = raw.decode("utf-8", errors="replace") if raw else None
+    # Forward the body bytes as received; nothing here needs them parsed
+    raw = await request.body()
 
     log.info("passthrough: %s /%s", request.method, full_path)
 
-    async with httpx.AsyncClient(timeout=300) as client:
-        resp = await client.request(
-            method=request.method,
-            url=f"{BACKEND_URL}/{full_path}",
-            json=body if isinstance(body, dict) else None,
-            content=body.encode() if isinstance(body, str) else None,
-            headers={
-                "Content-Type": request.headers.get("content-type", "application/json")
-            },
-        )
+    resp = await client.request(
+        method=request.method,
+        url=f"/{full_path}",
+        content=raw or None,
+        headers={
+            "Content-Type": request.headers.get("content-type", "application/json")
+        },
+    )
 
-    try:
-        return JSONResponse(content=resp.json(), status_code=resp.status_code)
-    except Exception:
-        from fastapi.responses import PlainTextResponse
-        return PlainTextResponse(content=resp.text, status_code=resp.status_code)
+    return _relay(resp)
 
 
 if __name__ == "__main__":
@@ -263,4 +369,13 @@ if __name__ == "__main__":
         STRIP_TIMESTAMPS,
         STRIP_MESSAGE_IDS,
     )
-    uvicorn.run(app, host="0.0.0.0", port=LISTEN_PORT)
+    # loop/http "auto" pick uvloop + httptools when installed (uvicorn[standard];
+    # uvloop is skipped on Windows). Access log off: each request is logged above.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=LISTEN_PORT,
+        loop="auto",
+        http="auto",
+        access_log=False,
+    )
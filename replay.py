@@ -1,6 +1,7 @@
 """
-Replay captured requests through the optimization proxy, one at a time.
-Reads request bodies from proxy_capture.log and POSTs them to the proxy.
+Replay captured requests through the optimization proxy.
+Reads request bodies from proxy_capture.log and POSTs them to the proxy,
+all at once by default, or one at a time with --interactive.
 
 Shows:
   - What normalization the proxy applied (ts/msg_id removals)
@@ -13,55 +14,64 @@ After each request, check llama-server console for:
   prompt eval time (want this lower on requests 2+)
 """
 
-import json
+import argparse
+import asyncio
 import re
 import time
-import urllib.request
-import urllib.error
+
+import httpx
+import orjson
 
 LOG_FILE = r"C:\projects\openclawproxy\proxy_capture.log"
 PROXY_URL = "http://localhost:1234/v1/responses"
 
 # ── Extract request bodies from the log ──────────────────────────────────────
 
-def extract_requests(log_path):
-    """Parse all POST /v1/responses request bodies out of the capture log."""
-    with open(log_path, encoding="utf-8", errors="replace") as f:
-        content = f.read()
-
-    # Each request block starts with the BODY: marker after a CATCH-ALL header
-    # Split on the log timestamp + BODY: pattern
-    body_pattern = re.compile(
-        r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+ BODY:\n(\{)',
-        re.MULTILINE
-    )
-
-    requests = []
-    matches = list(body_pattern.finditer(content))
-
-    for i, m in enumerate(matches):
-        # The JSON starts at the '{' — find where it ends by scanning forward
-        start = m.start(1)
-        # Find the next log timestamp line to know where the JSON ends
-        if i + 1 < len(matches):
-            # Search backwards from next match for end of JSON
-            end_search = content[start:m.end(1) + 500000]  # up to 500KB
-            next_ts = re.search(r'\n\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+', end_search)
-            if next_ts:
-                json_str = end_search[:next_ts.start()]
-            else:
-                json_str = end_search
-        else:
-            json_str = content[start:]
-
-        try:
-            body = json.loads(json_str.strip())
-            if "input" in body:  # only include actual /v1/responses requests
-                requests.append(body)
-        except json.JSONDecodeError:
-            pass  # skip malformed blocks
-
-    return requests
+# Every log record starts with the logging timestamp; the JSON body lines
+# following a BODY: record don't. Bytes patterns: the log is scanned
+# undecoded (\r? for logs written on Windows).
+_RECORD_RE = re.compile(rb'\d{4}-\d{2}-\d{2} \d\d:\d\d:\d\d,')
+_BODY_RE = re.compile(rb'\d{4}-\d{2}-\d{2} \d\d:\d\d:\d\d,\d+ BODY:\r?$')
+
+
+def _load_body(lines):
+    """Parse a captured BODY: block; None if malformed or not /v1/responses."""
+    try:
+        body = orjson.loads(b"".join(lines))
+    except orjson.JSONDecodeError:
+        return None  # skip malformed blocks
+    if "input" not in body:  # only include actual /v1/responses requests
+        return None
+    return body
+
+
+def iter_request_bodies(log_path):
+    """Yield all POST /v1/responses request bodies from the capture log.
+
+    Single pass over the log, one line at a time: a BODY: record switches to
+    capture mode, and the body's closing brace ends it. Bodies are logged
+    with indent=2, which escapes newlines inside strings, so the top-level
+    object is closed by the only unindented "}" line — its exact extent is
+    known without scanning characters or waiting for the next record. The
+    file is never read into memory whole, and lines stay undecoded bytes
+    that orjson parses directly.
+    """
+    buf = None
+    with open(log_path, "rb") as f:
+        for line in f:
+            if buf is not None:
+                if not _RECORD_RE.match(line):
+                    buf.append(line)
+                    if line.rstrip() == b"}":
+                        body = _load_body(buf)
+                        buf = None
+                        if body is not None:
+                            yield body
+                    continue
+                buf = None  # not a JSON object, or truncated; next record began
+
+            if _BODY_RE.match(line):
+                buf = []
 
 
 def summarize_input(input_items):
@@ -73,27 +83,42 @@ def summarize_input(input_items):
     return f"{len(input_items)} items: [{', '.join(roles)}]"
 
 
-def consume_sse_stream(response):
-    """Read a streaming SSE response and collect the final text."""
-    output_text = ""
+async def aiter_sse_lines(response):
+    """Yield the lines of a streaming httpx response as undecoded bytes."""
+    pending = b""
+    async for chunk in response.aiter_bytes():
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def consume_sse_stream(lines):
+    """Read a streaming SSE response and collect the final text.
+
+    Lines are handled as bytes: anything that isn't a data: line is skipped
+    without being decoded, and orjson parses the payload bytes directly.
+    """
+    deltas = []
+    final_text = None
     tool_calls = []
     usage = {}
 
-    for line in response:
-        line = line.decode("utf-8", errors="replace").strip()
-        if not line.startswith("data:"):
+    async for line in lines:
+        if not line.startswith(b"data:"):
             continue
-        data_str = line[5:].strip()
-        if not data_str:
+        payload = line[5:].strip()
+        if not payload:
             continue
         try:
-            data = json.loads(data_str)
-        except json.JSONDecodeError:
+            data = orjson.loads(payload)
+        except orjson.JSONDecodeError:
             continue
 
         t = data.get("type", "")
         if t == "response.output_text.delta":
-            output_text += data.get("delta", "")
+            deltas.append(data.get("delta", ""))
         elif t == "response.completed":
             resp = data.get("response", {})
             usage = resp.get("usage", {})
@@ -102,91 +127,140 @@ def consume_sse_stream(response):
                     tool_calls.append(item.get("name", "?"))
                 elif item.get("type") == "message":
                     for block in item.get("content", []):
-                        if block.get("type") == "output_text":
-                            output_text = block.get("text", output_text)
+                        if block.get("type") == "output_text" and "text" in block:
+                            final_text = block["text"]
 
+    output_text = "".join(deltas) if final_text is None else final_text
     return output_text.strip(), tool_calls, usage
 
 
 # ── Main replay loop ──────────────────────────────────────────────────────────
 
+async def send_one(client, body):
+    """POST one request to the proxy and collect its SSE response.
+
+    Returns (elapsed, result): result is consume_sse_stream's tuple, or the
+    httpx.HTTPError that ended the request.
+    """
+    t0 = time.time()
+    try:
+        async with client.stream(
+            "POST",
+            PROXY_URL,
+            # Force streaming on so we get SSE back
+            content=orjson.dumps({**body, "stream": True}),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": "Bearer llama",
+                "Accept": "application/json",
+            },
+        ) as resp:
+            resp.raise_for_status()
+            result = await consume_sse_stream(aiter_sse_lines(resp))
+    except httpx.HTTPError as e:
+        return time.time() - t0, e
+    return time.time() - t0, result
+
+
+def print_request(req_num, total, body):
+    inp = body.get("input", [])
+    print(f"{'='*60}")
+    print(f"REQUEST {req_num}/{total}")
+    print(f"  Input:  {summarize_input(inp)}")
+    print(f"  Stream: {body.get('stream', False)}")
+
+
+def print_result(elapsed, result):
+    if isinstance(result, httpx.HTTPError):
+        print(f"  ERROR after {elapsed:.1f}s: {result}")
+        print("  Is the proxy running on port 1234?")
+        return
+
+    output_text, tool_calls, usage = result
+    print(f"  Done in {elapsed:.1f}s")
+    print(f"  Usage:  {usage}")
+    if tool_calls:
+        print(f"  Tools called: {tool_calls}")
+    print(f"\n  Model response:")
+    # Print first 400 chars of response
+    preview = output_text[:400]
+    if len(output_text) > 400:
+        preview += f"... [{len(output_text)} chars total]"
+    for line in preview.splitlines():
+        print(f"    {line}")
+
+
+async def replay(requests, interactive):
+    """Send the requests through the proxy.
+
+    By default they are issued concurrently, so llama-server sees several
+    prefix-sharing prompts at once and its slot batching / cache reuse shows
+    up in the timings. With interactive=True they go one at a time, pausing
+    for Enter so the llama-server console can be checked after each.
+    """
+    async with httpx.AsyncClient(timeout=300) as client:
+        if interactive:
+            for req_num, body in enumerate(requests, 1):
+                print_request(req_num, len(requests), body)
+                print(f"\n  Sending to proxy... (waiting for response)")
+                print_result(*await send_one(client, body))
+                print()
+                if req_num < len(requests):
+                    input(f"  >>> Press Enter to send request {req_num + 1}...")
+                    print()
+            return
+
+        print(f"Sending {len(requests)} requests concurrently... (waiting for responses)\n")
+        results = await asyncio.gather(*(send_one(client, body) for body in requests))
+        for req_num, (body, (elapsed, result)) in enumerate(zip(requests, results), 1):
+            print_request(req_num, len(requests), body)
+            print_result(elapsed, result)
+            print()
+
+
 def main():
-    print("Loading requests from log...")
-    all_requests = extract_requests(LOG_FILE)
-    print(f"Found {len(all_requests)} total captured requests\n")
+    parser = argparse.ArgumentParser(description="Replay captured requests through the proxy.")
+    parser.add_argument(
+        "--interactive",
+        action="store_true",
+        help="send requests one at a time, pausing for Enter between them",
+    )
+    args = parser.parse_args()
+
+    print("Scanning requests from log...")
 
     # Find the second conversation: look for the reset where input shrinks to 2 items
-    # (system + new-session-greet only)
+    # (system + new-session-greet only). The log is read lazily, so scanning
+    # stops as soon as 3 requests from that conversation are collected.
     conv2_start = None
-    for i, req in enumerate(all_requests):
-        inp = req.get("input", [])
-        if len(inp) == 2:
+    conv2 = []
+    fallback = []
+    for i, req in enumerate(iter_request_bodies(LOG_FILE)):
+        if conv2_start is None:
+            inp = req.get("input", [])
             roles = [x.get("role") or x.get("type") for x in inp]
-            if roles == ["system", "user"]:
-                if i > 0:  # skip the very first request
-                    conv2_start = i
-                    break
+            if i > 0 and roles == ["system", "user"]:  # skip the very first request
+                conv2_start = i
+            else:
+                if len(fallback) < 3:
+                    fallback.append(req)
+                continue
+
+        # Take 3 requests from conversation 2
+        conv2.append(req)
+        if len(conv2) == 3:
+            break
 
     if conv2_start is None:
         print("Could not find a second conversation (session reset) in the log.")
         print("Replaying from request index 0 instead.")
         conv2_start = 0
+        conv2 = fallback
 
-    # Take 3 requests from conversation 2
-    conv2 = all_requests[conv2_start:conv2_start + 3]
     print(f"Second conversation starts at captured request index {conv2_start}")
     print(f"Replaying {len(conv2)} requests:\n")
 
-    for req_num, body in enumerate(conv2, 1):
-        inp = body.get("input", [])
-        print(f"{'='*60}")
-        print(f"REQUEST {req_num}/{len(conv2)}")
-        print(f"  Input:  {summarize_input(inp)}")
-        print(f"  Stream: {body.get('stream', False)}")
-
-        # Force streaming on so we get SSE back
-        body["stream"] = True
-
-        payload = json.dumps(body).encode("utf-8")
-        req = urllib.request.Request(
-            PROXY_URL,
-            data=payload,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": "Bearer llama",
-                "Accept": "application/json",
-            },
-            method="POST",
-        )
-
-        print(f"\n  Sending to proxy... (waiting for response)")
-        t0 = time.time()
-        try:
-            with urllib.request.urlopen(req, timeout=300) as resp:
-                output_text, tool_calls, usage = consume_sse_stream(resp)
-            elapsed = time.time() - t0
-
-            print(f"  Done in {elapsed:.1f}s")
-            print(f"  Usage:  {usage}")
-            if tool_calls:
-                print(f"  Tools called: {tool_calls}")
-            print(f"\n  Model response:")
-            # Print first 400 chars of response
-            preview = output_text[:400]
-            if len(output_text) > 400:
-                preview += f"... [{len(output_text)} chars total]"
-            for line in preview.splitlines():
-                print(f"    {line}")
-
-        except urllib.error.URLError as e:
-            elapsed = time.time() - t0
-            print(f"  ERROR after {elapsed:.1f}s: {e}")
-            print("  Is the proxy running on port 1234?")
-
-        print()
-        if req_num < len(conv2):
-            input(f"  >>> Press Enter to send request {req_num + 1}...")
-            print()
+    asyncio.run(replay(conv2, args.interactive))
 
 
 if __name__ == "__main__":